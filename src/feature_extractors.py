@@ -2,39 +2,458 @@
 """
 Feature Extractors for Sea Shanties Analysis Project
 
-Each feature extractor implements a common interface: extract(score).
-The score is a music21 stream (or score) and the extract method
+Each feature extractor is a function with a common interface: extractor(ctx).
+The ctx is a ScoreFeatures object holding the note data of a music21
+stream (or score), gathered in a single traversal, and the extractor
 computes a normalized feature (between 0 and 1) for that score.
+Extractors are registered by feature name in EXTRACTORS.
 """
 
-from abc import ABC, abstractmethod
-import math
-import statistics
-import music21
+from array import array
+from dataclasses import dataclass
+import re
+import weakref
+import numpy as np
 
 
 # ============================================================
-# Base FeatureExtractor class
+# Shared score context
 # ============================================================
-class FeatureExtractor(ABC):
+# Version of the data stored in ScoreFeatures. Bump it whenever a cached context would
+# come out differently: when build_score_features or build_score_features_from_midi
+# changes what it collects, or when the part or track chosen for analysis changes
+# (select_score_for_analysis, _is_voice_track), so that cached contexts are rebuilt.
+SCORE_FEATURES_VERSION = 3
+
+
+@dataclass
+class ScoreFeatures:
+    """
+    Note-level data of a score, extracted once and shared by all extractors.
+
+    Attributes:
+        midi (np.ndarray): MIDI numbers of the notes, the lowest one for chords (int8).
+        pitch_histogram (np.ndarray): Count of each MIDI number, 0 to 127.
+        diffs (np.ndarray): Signed intervals between consecutive pitches, in semitones (int8).
+        abs_diffs (np.ndarray): Absolute intervals between consecutive pitches, in semitones (int8).
+        interval_histogram (np.ndarray): Count of each absolute interval size, 0 to 127 semitones.
+        quarter_lengths (np.ndarray): Durations of all notes, in quarter lengths (float32).
+        duration_values (np.ndarray): The distinct durations, sorted.
+        duration_codes (np.ndarray): Index of each note's duration in duration_values.
+        duration_counts (np.ndarray): Number of notes with each distinct duration.
+        offsets (np.ndarray): Onsets of all notes relative to their container (float32).
+        measure_note_counts (np.ndarray): Number of notes in each measure (int32).
+        rest_count (int): Number of rests in the score.
+    """
+
+    midi: np.ndarray
+    pitch_histogram: np.ndarray
+    diffs: np.ndarray
+    abs_diffs: np.ndarray
+    interval_histogram: np.ndarray
+    quarter_lengths: np.ndarray
+    duration_values: np.ndarray
+    duration_codes: np.ndarray
+    duration_counts: np.ndarray
+    offsets: np.ndarray
+    measure_note_counts: np.ndarray
+    rest_count: int
+
+
+def build_score_features(score):
+    """
+    Walks the music21 stream once and collects the data needed by the extractors.
+
+    Args:
+        score (music21.stream.Score): A music score.
+
+    Returns:
+        ScoreFeatures: The shared extraction context.
+    """
+    # music21 is only needed for scores it parsed, so the symusic path never imports it.
+    import music21
+
+    # Typed buffers hold the values unboxed and are handed to NumPy without copying.
+    pitches = array("b")
+    quarter_lengths = array("f")
+    offsets = array("f")
+    onsets = array("d")
+    rest_count = 0
+    # recurse() walks the existing tree; flatten() would first copy every element
+    # into a new stream (about twice as slow) and would turn the measure-relative
+    # offsets used for syncopation into absolute ones.
+    elements = score.recurse().notesAndRests
+    for n in elements:
+        if n.isRest:
+            rest_count += 1
+            continue
+        quarter_lengths.append(n.quarterLength)
+        offsets.append(n.offset)
+        onsets.append(elements.currentHierarchyOffset())
+        if n.isNote:
+            pitches.append(n.pitch.midi)
+        else:
+            # A chord contributes its lowest pitch, whatever order its notes were read in.
+            # Drums (Unpitched, or a PercussionChord of them) have no pitch and are
+            # left out of the pitch data, though they still count as onsets.
+            chord_pitches = n.pitches
+            if chord_pitches:
+                pitches.append(min(p.midi for p in chord_pitches))
+
+    # Assign every note to the measure it starts in, instead of flattening each measure.
+    measure_offsets = np.array(
+        [m.offset for m in score.getElementsByClass(music21.stream.Measure)],
+        dtype=np.float64,
+    )
+    measure_index = (
+        np.searchsorted(measure_offsets, np.frombuffer(onsets, dtype=np.float64), side="right") - 1
+    )
+    measure_note_counts = np.bincount(
+        measure_index[measure_index >= 0], minlength=measure_offsets.size
+    )
+
+    return _assemble_score_features(
+        pitches, quarter_lengths, offsets, measure_note_counts, rest_count
+    )
+
+
+def _assemble_score_features(pitches, quarter_lengths, offsets, measure_note_counts, rest_count):
+    """
+    Converts the collected note data to compact arrays and derives the interval data.
+    Arrays that already have the right dtype are used without copying.
+    """
+    midi = np.asarray(pitches, dtype=np.int8)
+    # MIDI pitches lie in 0-127, so their differences always fit in int8 as well.
+    diffs = np.diff(midi)
+    abs_diffs = np.abs(diffs)
+    quarter_lengths = np.asarray(quarter_lengths, dtype=np.float32)
+    duration_values, duration_codes, duration_counts = np.unique(
+        quarter_lengths, return_inverse=True, return_counts=True
+    )
+
+    return ScoreFeatures(
+        midi=midi,
+        pitch_histogram=np.bincount(midi, minlength=128),
+        diffs=diffs,
+        abs_diffs=abs_diffs,
+        interval_histogram=np.bincount(abs_diffs, minlength=128),
+        quarter_lengths=quarter_lengths,
+        duration_values=duration_values,
+        duration_codes=duration_codes,
+        duration_counts=duration_counts,
+        offsets=np.asarray(offsets, dtype=np.float32),
+        measure_note_counts=np.asarray(measure_note_counts, dtype=np.int32),
+        rest_count=rest_count,
+    )
+
+
+# ============================================================
+# MIDI fast path (symusic)
+# ============================================================
+
+# Grid used by music21 when quantizing MIDI: sixteenths and eighth-note triplets.
+_QUANTIZE_TICKS = (0.25, 1 / 3)
+
+
+def _quantize(values, gaps=None, zero_allowed=True):
+    """
+    Snaps quarter-length values to the closest sixteenth or triplet grid point,
+    following the rules of music21's Stream.quantize (ties round down, the
+    finer grid wins, and durations prefer the grid that fills the gap to the
+    next onset).
+    """
+    best = None
+    for tick in _QUANTIZE_TICKS:
+        low = np.floor(values / tick) * tick
+        match = np.where(values - low <= tick / 2, low, low + tick)
+        if not zero_allowed:
+            match = np.where(match == 0, tick, match)
+        error = np.round(np.abs(values - match), 7)
+        if gaps is None:
+            remaining = np.zeros_like(values)
+        else:
+            # music21 tests the gap with an exact float modulo, so a gap of whole
+            # quarters does not count as filled by the triplet grid.
+            on_grid = np.mod(gaps, tick) == 0
+            remaining = np.where(on_grid, 0.0, np.maximum(gaps - match, 0.0))
+        if best is None:
+            best = (remaining, error, match)
+            continue
+        better = (remaining < best[0]) | ((remaining == best[0]) & (error < best[1]))
+        best = tuple(np.where(better, new, old) for new, old in zip((remaining, error, match), best))
+    return best[2]
+
+
+def _bar_offsets(time_signatures, tpq, end):
+    """
+    Lays out bars from the time signature events until the given end (in quarter lengths).
+    Bars before the first time signature are in 4/4, and of several signatures
+    at the same time the last one applies.
+
+    Returns:
+        tuple: (np.ndarray of bar start offsets, offset where the last bar ends)
+
+    Raises:
+        ValueError: If a time signature gives bars no length (e.g. 0/4), which
+            music21 rejects as well.
+    """
+    # The sort is stable, so signatures at the same time keep their file order.
+    signatures = sorted(
+        ((ts.time / tpq, ts.numerator * 4 / ts.denominator) for ts in time_signatures),
+        key=lambda signature: signature[0],
+    )
+    # An empty bar would never move the layout forward.
+    for _, bar_length in signatures:
+        if bar_length <= 0:
+            raise ValueError(f"Invalid time signature with a bar length of {bar_length}")
+    starts = []
+    position = 0.0
+    bar_length = 4.0
+    i = 0
+    while position < end - 1e-9:
+        while i < len(signatures) and signatures[i][0] <= position + 1e-9:
+            bar_length = signatures[i][1]
+            i += 1
+        starts.append(position)
+        position += bar_length
+    return np.array(starts, dtype=np.float64), position
+
+
+# Words marking an instrument or track name as sung, e.g. "Voice", "Lead Vocals" or "Singer".
+VOICE_NAME_TOKENS = ("voice", "vocal", "singer")
+
+# Matches names containing any of the voice tokens, in any case.
+VOICE_NAME_RE = re.compile("|".join(map(re.escape, VOICE_NAME_TOKENS)), re.IGNORECASE)
+
+# General MIDI programs of sung sounds (Choir Aahs, Voice Oohs, Synth Voice),
+# which music21 imports as vocalists.
+_VOICE_PROGRAMS = range(52, 55)
+
+
+def _is_voice_track(track):
+    """
+    Tells whether a symusic track is sung, the way music21 recognizes voice parts.
+    """
+    # A program number and a name are plain attributes of the track, read without
+    # building any instrument object.
+    return track.program in _VOICE_PROGRAMS or VOICE_NAME_RE.search(track.name) is not None
+
+
+def select_score_for_analysis(score):
+    """
+    Given a music21 score, chooses the best score for analyzing melodic features.
+    If voice parts are present, return the first recognized voice part.
+    Otherwise, return the entire score or the first part.
+
+    Args:
+        score (music21.stream.Score): The parsed music score.
+
+    Returns:
+        music21.stream.Score or Part: The portion of the score to analyze.
+    """
+    # Look the parts up once: hasattr would build the iterator just to discard it.
+    parts = getattr(score, "parts", None)
+    if parts is not None:
+        parts = list(parts)
+        if parts:
+            # Stop at the first part with a vocalist or voice indication.
+            voice_part = next((part for part in parts if is_voice_part(part)), None)
+            return voice_part if voice_part is not None else parts[0]
+    return score
+
+
+def is_voice_instrument(instr):
+    """
+    Tells whether an instrument is a vocalist or is named like a voice.
+
+    Args:
+        instr (music21.instrument.Instrument): An instrument of a part.
+
+    Returns:
+        bool: True if the instrument is sung.
     """
-    Abstract base class for a feature extractor.
+    # music21 objects list the names of their classes, which spares importing the
+    # module (or looking it up) for every instrument checked.
+    if "Vocalist" in instr.classes:
+        return True
+    name = instr.instrumentName
+    return bool(name) and VOICE_NAME_RE.search(name) is not None
+
 
-    Child classes must implement the extract() method.
+def is_voice_part(part):
     """
+    Tells whether any instrument of a part is a vocalist or is named like a voice.
 
-    @abstractmethod
-    def extract(self, score):
-        """
-        Extract the feature from the music21 stream (score).
+    Args:
+        part (music21.stream.Part): A part of a score.
 
-        Args:
-            score (music21.stream.Score): A music score.
+    Returns:
+        bool: True if the part is sung.
+    """
+    # Iterate the instruments lazily, stopping at the first sung one. Unlike
+    # getInstruments, this neither builds a Stream of all of them nor makes a
+    # default Instrument for parts without any, which is never sung anyway.
+    instruments = part.recurse().getElementsByClass("Instrument")
+    return any(is_voice_instrument(instr) for instr in instruments)
+
+
+def build_score_features_from_midi(midi_path):
+    """
+    Builds the ScoreFeatures context straight from a MIDI file with symusic,
+    skipping the construction of a music21 score.
+
+    The track analyzed is the first one named like a voice or playing a sung
+    General MIDI sound, otherwise the first track with notes. music21's MIDI
+    import is approximated: onsets and durations are quantized the same way,
+    simultaneous onsets form chords, notes are split at barlines, bars follow
+    the time signatures and every silent stretch within a bar counts as one
+    rest. The features are not guaranteed to match the music21 path:
+    - music21 splits a silence into several notatable rests, so rest_frequency
+      is usually lower here;
+    - music21 can extend a part's bars towards the end of the whole score, while
+      here they stop at the analyzed track's last note, which changes the
+      bar-based features;
+    - notes that overlap or sit close together can be quantized or grouped into
+      chords differently, which changes the pitch and rhythm features.
+    On the bundled data, 25 of the 40 shanty book files differ (all of them in
+    rest_frequency); the files of all_songs match.
+
+    Requires the optional symusic package.
 
-        Returns:
-            float: The computed feature.
-        """
-        raise NotImplementedError("Subclasses must implement this method")
+    Args:
+        midi_path (str): Path to a MIDI file.
+
+    Returns:
+        ScoreFeatures: The shared extraction context.
+    """
+    from symusic import Score
+
+    midi_score = Score(midi_path)
+    tracks = [t for t in midi_score.tracks if not t.is_drum and len(t.notes) > 0]
+    if not tracks:
+        return _assemble_score_features([], [], [], [], 0)
+    track = next((t for t in tracks if _is_voice_track(t)), tracks[0])
+    notes = track.notes.numpy()
+    tpq = midi_score.tpq
+
+    onsets = _quantize(notes["time"] / tpq)
+    order = np.lexsort((notes["pitch"], onsets))
+    onsets = onsets[order]
+    raw_durations = notes["duration"][order] / tpq
+    note_pitches = notes["pitch"][order]
+
+    # Notes starting together form a chord, represented by its lowest pitch.
+    event_onsets, first = np.unique(onsets, return_index=True)
+    gaps = np.append(np.diff(event_onsets), 0.0)
+    event_durations = _quantize(raw_durations[first], gaps, zero_allowed=False)
+    event_pitches = note_pitches[first]
+
+    measure_offsets, score_end = _bar_offsets(
+        midi_score.time_signatures, tpq, (event_onsets + event_durations).max()
+    )
+    bar_lines = np.append(measure_offsets, score_end)
+
+    # Notes crossing a barline become tied notes, one per bar. The pieces of all
+    # notes are laid out in one array: piece j of a note starts at its onset for
+    # j == 0, or else at the j-th barline after the onset.
+    event_ends = event_onsets + event_durations
+    next_bar = np.searchsorted(bar_lines, event_onsets, side="right")
+    crossings = np.searchsorted(bar_lines + 1e-9, event_ends, side="left") - next_bar
+    pieces = np.maximum(crossings, 0) + 1
+    source = np.repeat(np.arange(event_onsets.size), pieces)
+    piece = np.arange(source.size) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    bar = next_bar[source] + piece
+    split_onsets = np.where(piece == 0, event_onsets[source], bar_lines[bar - 1])
+    split_durations = np.minimum(event_ends[source], bar_lines[bar]) - split_onsets
+    event_onsets = split_onsets
+    event_pitches = event_pitches[source].astype(np.int8)
+
+    measure_index = np.searchsorted(measure_offsets, event_onsets, side="right") - 1
+    measure_note_counts = np.bincount(measure_index, minlength=measure_offsets.size)
+
+    # Silent stretches, cut at the barlines they cross.
+    sounding_until = np.maximum.accumulate(event_onsets + split_durations)
+    gap_starts = np.concatenate(([0.0], sounding_until))
+    gap_ends = np.concatenate((event_onsets, [score_end]))
+    silent = gap_ends - gap_starts > 1e-6
+    first_bar = np.searchsorted(measure_offsets, gap_starts[silent], side="right")
+    last_bar = np.searchsorted(measure_offsets, gap_ends[silent], side="left")
+    rest_count = int((last_bar - first_bar + 1).sum())
+
+    return _assemble_score_features(
+        event_pitches,
+        split_durations,
+        event_onsets - measure_offsets[measure_index],
+        measure_note_counts,
+        rest_count,
+    )
+
+
+# Contexts of the scores seen so far, released together with the score objects.
+_CONTEXT_CACHE = weakref.WeakKeyDictionary()
+
+
+def get_score_features(score):
+    """
+    Returns the ScoreFeatures context of a score, building it on first use.
+
+    Repeated extraction on the same score object (e.g. while iterating in a
+    notebook) reuses the cached context. The score must not be modified
+    after its context has been built.
+
+    Args:
+        score (music21.stream.Score): A music score.
+
+    Returns:
+        ScoreFeatures: The shared extraction context.
+    """
+    ctx = _CONTEXT_CACHE.get(score)
+    if ctx is None:
+        ctx = build_score_features(score)
+        _CONTEXT_CACHE[score] = ctx
+    return ctx
+
+
+def entropy_from_counts(counts):
+    """
+    Computes the Shannon entropy (in bits) of a histogram.
+
+    Args:
+        counts (np.ndarray): Number of occurrences of each value; empty bins are ignored.
+
+    Returns:
+        float: The entropy of the distribution.
+    """
+    counts = counts[counts > 0]
+    # A single distinct value (or none) carries no information; skip the logarithms.
+    if counts.size < 2:
+        return 0.0
+    p = counts / counts.sum()
+    return float(-(p * np.log2(p)).sum())
+
+
+def ngram_repetition(codes, n):
+    """
+    Computes the share of repeated n-grams in a sequence of non-negative integer codes.
+
+    Each n-gram is hashed to a single int64 as a polynomial in the alphabet size
+    (largest code + 1), evaluated over shifted views of the array. The hash is
+    collision-free as long as alphabet_size ** n fits in 63 bits.
+
+    Args:
+        codes (np.ndarray): The encoded sequence, at least n long.
+        n (int): The n-gram length.
+
+    Returns:
+        float: 1 minus the ratio of distinct n-grams to all n-grams.
+    """
+    codes = codes.astype(np.int64)
+    base = int(codes.max()) + 1
+    count = codes.size - n + 1
+    keys = codes[:count]
+    for i in range(1, n):
+        keys = keys * base + codes[i : i + count]
+    return 1 - (np.unique(keys).size / count)
 
 
 # ============================================================
@@ -42,144 +461,85 @@ class FeatureExtractor(ABC):
 # ============================================================
 
 
-class PitchRangeExtractor(FeatureExtractor):
+# Interval sizes in semitones, indexing the bins of ScoreFeatures.interval_histogram.
+# MIDI pitches span 0-127, so no interval is larger than 127 semitones.
+_INTERVAL_SIZES = np.arange(128)
+
+
+def pitch_range(ctx):
     """
     Computes the pitch range as the difference between the highest and lowest pitches.
     Returns the range in MIDI numbers.
     """
-
-    def extract(self, score):
-        pitch_values = []
-        for n in score.recurse().notes:
-            if hasattr(n, "pitch"):
-                pitch_values.append(n.pitch.midi)
-        if not pitch_values:
-            return 0.0
-        range_val = max(pitch_values) - min(pitch_values)
-        return range_val
+    if ctx.midi.size == 0:
+        return 0.0
+    range_val = int(ctx.midi.max()) - int(ctx.midi.min())
+    return range_val
 
 
-class AverageIntervalExtractor(FeatureExtractor):
+def average_interval(ctx):
     """
     Calculates the average absolute interval (in semitones) between consecutive notes.
     """
+    if ctx.midi.size < 2:
+        return 0.0
+    sizes = _INTERVAL_SIZES[: ctx.interval_histogram.size]
+    avg_interval = float((sizes * ctx.interval_histogram).sum() / ctx.abs_diffs.size)
+    return avg_interval
 
-    def extract(self, score):
-        pitches = []
-        for n in score.recurse().notes:
-            if hasattr(n, "pitch"):
-                pitches.append(n.pitch.midi)
-        if len(pitches) < 2:
-            return 0.0
-        intervals = [abs(b - a) for a, b in zip(pitches[:-1], pitches[1:])]
-        avg_interval = statistics.mean(intervals)
-        return avg_interval
 
-
-class IntervalComplexityExtractor(FeatureExtractor):
+def interval_complexity(ctx):
     """
     Quantifies the diversity of intervals using Shannon entropy (in bits).
     """
+    if ctx.midi.size < 2:
+        return 0.0
+    entropy = entropy_from_counts(ctx.interval_histogram)
+    return entropy
+
 
-    def extract(self, score):
-        pitches = []
-        for n in score.recurse().notes:
-            if hasattr(n, "pitch"):
-                pitches.append(n.pitch.midi)
-        if len(pitches) < 2:
-            return 0.0
-        intervals = [abs(b - a) for a, b in zip(pitches[:-1], pitches[1:])]
-        if not intervals:
-            return 0.0
-        # Frequency distribution of intervals
-        unique_intervals = {}
-        for iv in intervals:
-            unique_intervals[iv] = unique_intervals.get(iv, 0) + 1
-        total = len(intervals)
-        entropy = 0.0
-        for count in unique_intervals.values():
-            p = count / total
-            entropy -= p * math.log2(p)
-        return entropy
-
-
-class LeapFrequencyExtractor(FeatureExtractor):
+def leap_frequency(ctx):
     """
     Computes the leap frequency: the proportion of intervals that are larger than a step (defined here as >2 semitones).
     This feature is inherently a ratio between 0 and 1.
     """
+    if ctx.midi.size < 2:
+        return 0.0
+    frequency = float(ctx.interval_histogram[3:].sum() / ctx.abs_diffs.size)
+    return frequency
 
-    def extract(self, score):
-        pitches = []
-        for n in score.recurse().notes:
-            if hasattr(n, "pitch"):
-                pitches.append(n.pitch.midi)
-        if len(pitches) < 2:
-            return 0.0
-        leaps = [1 for a, b in zip(pitches[:-1], pitches[1:]) if abs(b - a) > 2]
-        frequency = sum(leaps) / (len(pitches) - 1)
-        return frequency
 
-
-class ContourDirectionalityExtractor(FeatureExtractor):
+def contour_directionality(ctx):
     """
     Measures directional movement by returning the ratio of upward intervals.
     This ratio is inherently between 0 and 1.
     """
-
-    def extract(self, score):
-        pitches = []
-        for n in score.recurse().notes:
-            if hasattr(n, "pitch"):
-                pitches.append(n.pitch.midi)
-        if len(pitches) < 2:
-            return 0.0
-        upward = 0
-        total = 0
-        for a, b in zip(pitches[:-1], pitches[1:]):
-            if b != a:
-                total += 1
-                if b > a:
-                    upward += 1
-        ratio = upward / total if total > 0 else 0.0
-        return ratio
+    if ctx.midi.size < 2:
+        return 0.0
+    moves = ctx.diffs[ctx.diffs != 0]
+    ratio = float((moves > 0).mean()) if moves.size > 0 else 0.0
+    return ratio
 
 
-class MelodicContourComplexityExtractor(FeatureExtractor):
+def melodic_contour_complexity(ctx):
     """
     Computes the complexity of the melodic contour by counting the number of directional changes.
     The value is normalized by the total number of intervals minus one (the maximum possible number of changes).
     """
+    if ctx.midi.size < 3:
+        return 0.0
+    # Determine direction: +1 for upward, -1 for downward, 0 for no change
+    directions = np.sign(ctx.diffs)
+    # Count directional changes (ignoring no-change segments)
+    filtered = directions[directions != 0]
+    changes = int(np.count_nonzero(np.diff(filtered)))
+    # Normalize changes by the maximum possible changes (total intervals - 1)
+    total_intervals = ctx.midi.size - 1
+    if total_intervals <= 0:
+        return 0.0
 
-    def extract(self, score):
-        pitches = []
-        for n in score.recurse().notes:
-            if hasattr(n, "pitch"):
-                pitches.append(n.pitch.midi)
-        if len(pitches) < 3:
-            return 0.0
-        # Determine direction: +1 for upward, -1 for downward, 0 for no change
-        directions = []
-        for a, b in zip(pitches[:-1], pitches[1:]):
-            if b > a:
-                directions.append(1)
-            elif b < a:
-                directions.append(-1)
-            else:
-                directions.append(0)
-        # Count directional changes (ignoring no-change segments)
-        filtered = [d for d in directions if d != 0]
-        changes = 0
-        for a, b in zip(filtered[:-1], filtered[1:]):
-            if a != b:
-                changes += 1
-        # Normalize changes by the maximum possible changes (total intervals - 1)
-        total_intervals = len(pitches) - 1
-        if total_intervals <= 0:
-            return 0.0
-
-        normalized_changes = changes / total_intervals
-        return normalized_changes
+    normalized_changes = changes / total_intervals
+    return normalized_changes
 
 
 # ============================================================
@@ -187,116 +547,75 @@ class MelodicContourComplexityExtractor(FeatureExtractor):
 # ============================================================
 
 
-class AverageNoteDurationExtractor(FeatureExtractor):
+def average_note_duration(ctx):
     """
     Computes the average note duration (using quarterLength values)
     and returns it in quarter length units.
     """
+    if ctx.quarter_lengths.size == 0:
+        return 0.0
+    total = (ctx.duration_values.astype(np.float64) * ctx.duration_counts).sum()
+    avg_duration = float(total / ctx.quarter_lengths.size)
+    return avg_duration
 
-    def extract(self, score):
-        durations = []
-        for n in score.recurse().notes:
-            durations.append(n.quarterLength)
-        if not durations:
-            return 0.0
-        avg_duration = statistics.mean(durations)
-        return avg_duration
 
-
-class RhythmComplexityExtractor(FeatureExtractor):
+def rhythm_complexity(ctx):
     """
     Measures the complexity of rhythms by computing the entropy of note durations (in bits).
     """
-
-    def extract(self, score):
-        durations = [n.quarterLength for n in score.recurse().notes]
-        if not durations:
-            return 0.0
-        unique_durations = {}
-        for d in durations:
-            unique_durations[d] = unique_durations.get(d, 0) + 1
-        total = len(durations)
-        entropy = 0.0
-        for count in unique_durations.values():
-            p = count / total
-            entropy -= p * math.log2(p)
-        return entropy
+    if ctx.quarter_lengths.size == 0:
+        return 0.0
+    entropy = entropy_from_counts(ctx.duration_counts)
+    return entropy
 
 
-class SyncopationExtractor(FeatureExtractor):
+def syncopation(ctx):
     """
     Computes a simple syncopation score by counting note onsets that are off the beat.
     Here we assume the downbeats occur at integer offsets (for example, in 4/4 time).
     Returns the ratio of syncopated note onsets to total note onsets.
     """
+    if ctx.offsets.size == 0:
+        return 0.0
+    off_beat = np.abs(ctx.offsets - np.round(ctx.offsets)) > 1e-5
+    ratio = float(off_beat.mean())
+    return ratio
 
-    def extract(self, score):
-        note_count = 0
-        syncopated = 0
-        for n in score.recurse().notes:
-            offset = n.offset
-            note_count += 1
-            if not math.isclose(offset % 1, 0.0, abs_tol=1e-5):
-                syncopated += 1
-        if note_count == 0:
-            return 0.0
-        ratio = syncopated / note_count
-        return ratio
 
-
-class NoteCountPerBarExtractor(FeatureExtractor):
+def note_count_per_bar(ctx):
     """
     Calculates the average number of note onsets per measure.
     """
-
-    def extract(self, score):
-        measures = score.getElementsByClass(music21.stream.Measure)
-        note_counts = []
-        for m in measures:
-            count = len(list(m.flatten().notes))
-            note_counts.append(count)
-        if not note_counts:
-            return 0.0
-        avg_notes = statistics.mean(note_counts)
-        return avg_notes
+    if ctx.measure_note_counts.size == 0:
+        return 0.0
+    avg_notes = float(ctx.measure_note_counts.mean())
+    return avg_notes
 
 
-class NoteCountPerBarVariabilityExtractor(FeatureExtractor):
+def note_count_per_bar_variability(ctx):
     """
     Computes the variance of the note counts per measure across the score.
     Returns the raw variance.
     """
+    note_counts = ctx.measure_note_counts[ctx.measure_note_counts > 0]
+    if note_counts.size < 2:
+        return 0.0
+    var_notes = float(note_counts.var(ddof=1))
+    return var_notes
 
-    def extract(self, score):
-        measures = score.getElementsByClass(music21.stream.Measure)
-        note_counts = [
-            len(list(m.flatten().notes)) for m in measures if m.flatten().notes
-        ]
-        if len(note_counts) < 2:
-            return 0.0
-        var_notes = statistics.variance(note_counts)
-        return var_notes
 
-
-class RestFrequencyExtractor(FeatureExtractor):
+def rest_frequency(ctx):
     """
     Computes the frequency of rests relative to notes.
     Returns the ratio of the number of rests to the total count of rests and notes.
     """
-
-    def extract(self, score):
-        note_count = 0
-        rest_count = 0
-        for elem in score.recurse().notesAndRests:
-            if isinstance(elem, music21.note.Note):
-                note_count += 1
-            elif isinstance(elem, music21.note.Rest):
-                rest_count += 1
-        total = note_count + rest_count
-        if total == 0:
-            return 0.0
-        freq = rest_count / total
-        return freq
+    note_count = len(ctx.midi)
+    rest_count = ctx.rest_count
+    total = note_count + rest_count
+    if total == 0:
+        return 0.0
+    freq = rest_count / total
+    return freq
 
 
 # ============================================================
@@ -304,94 +623,89 @@ class RestFrequencyExtractor(FeatureExtractor):
 # ============================================================
 
 
-class ScoreLengthInBarsExtractor(FeatureExtractor):
+def score_length_in_bars(ctx):
     """
     Counts the total number of measures (bars) in the score.
     Returns the raw count of bars.
     """
-
-    def extract(self, score):
-        measures = score.getElementsByClass(music21.stream.Measure)
-        bar_count = len(measures)
-        return bar_count
+    bar_count = len(ctx.measure_note_counts)
+    return bar_count
 
 
-class MelodicPatternRepetitionExtractor(FeatureExtractor):
+def melodic_pattern_repetition(ctx):
     """
     A simplified extractor for melodic pattern repetition.
-    This implementation converts the melody into a string of pitch numbers (separated by spaces)
+    This implementation takes the melody as a sequence of MIDI pitch numbers
     and counts how often n-grams (with n=3) are repeated. It returns a ratio of repetition,
     which is inherently between 0 and 1.
     """
+    n = 3
+    if ctx.midi.size < n:
+        return 0.0
+    repetition = ngram_repetition(ctx.midi, n)
+    return repetition
 
-    def extract(self, score):
-        pitches = [
-            str(n.pitch.midi) for n in score.recurse().notes if hasattr(n, "pitch")
-        ]
-        n = 3
-        if len(pitches) < n:
-            return 0.0
-        ngrams = [" ".join(pitches[i : i + n]) for i in range(len(pitches) - n + 1)]
-        unique = set(ngrams)
-        total = len(ngrams)
-        repetition = 1 - (len(unique) / total)
-        return repetition
 
-
-class RhythmicPatternRepetitionExtractor(FeatureExtractor):
+def rhythmic_pattern_repetition(ctx):
     """
     A simple extractor to measure rhythmic pattern repetition.
     It extracts a sequence of note durations, creates n-grams (n=3),
     and returns a repetition ratio (between 0 and 1).
     """
-
-    def extract(self, score):
-        durations = [str(n.quarterLength) for n in score.recurse().notes]
-        n = 3
-        if len(durations) < n:
-            return 0.0
-        ngrams = [" ".join(durations[i : i + n]) for i in range(len(durations) - n + 1)]
-        unique = set(ngrams)
-        total = len(ngrams)
-        repetition = 1 - (len(unique) / total)
-        return repetition
+    n = 3
+    if ctx.quarter_lengths.size < n:
+        return 0.0
+    repetition = ngram_repetition(ctx.duration_codes, n)
+    return repetition
 
 
-class EntropyOfPitchSequenceExtractor(FeatureExtractor):
+def entropy_of_pitch_sequence(ctx):
     """
     Uses Shannon entropy to measure unpredictability in the sequence of pitches (in bits).
     """
+    if ctx.midi.size == 0:
+        return 0.0
+    entropy = entropy_from_counts(ctx.pitch_histogram)
+    return entropy
 
-    def extract(self, score):
-        pitches = [n.pitch.midi for n in score.recurse().notes if hasattr(n, "pitch")]
-        if not pitches:
-            return 0.0
-        unique = {}
-        for p in pitches:
-            unique[p] = unique.get(p, 0) + 1
-        total = len(pitches)
-        entropy = 0.0
-        for count in unique.values():
-            p_val = count / total
-            entropy -= p_val * math.log2(p_val)
-        return entropy
 
-
-class VarianceInNoteDensityExtractor(FeatureExtractor):
+def variance_in_note_density(ctx):
     """
     Measures changes in note density (number of note onsets) across measures
     by returning the variance of note counts per measure.
     """
+    counts = ctx.measure_note_counts
+    if counts.size < 2:
+        return 0.0
+    var_value = float(counts.var(ddof=1))
+    return var_value
+
 
-    def extract(self, score):
-        measures = score.getElementsByClass(music21.stream.Measure)
-        counts = []
-        for m in measures:
-            counts.append(len(list(m.flatten().notes)))
-        if len(counts) < 2:
-            return 0.0
-        var_value = statistics.variance(counts)
-        return var_value
+# ============================================================
+# Extractor registry
+# ============================================================
+
+# Maps each feature name to the function computing it from a ScoreFeatures context.
+# The registry is open for extension: registering a function adds a feature.
+EXTRACTORS = {
+    "PitchRange": pitch_range,
+    "AverageInterval": average_interval,
+    "IntervalComplexity": interval_complexity,
+    "LeapFrequency": leap_frequency,
+    "ContourDirectionality": contour_directionality,
+    "MelodicContourComplexity": melodic_contour_complexity,
+    "AverageNoteDuration": average_note_duration,
+    "RhythmComplexity": rhythm_complexity,
+    "Syncopation": syncopation,
+    "NoteCountPerBar": note_count_per_bar,
+    "NoteCountPerBarVariability": note_count_per_bar_variability,
+    "RestFrequency": rest_frequency,
+    "ScoreLengthInBars": score_length_in_bars,
+    "MelodicPatternRepetition": melodic_pattern_repetition,
+    "RhythmicPatternRepetition": rhythmic_pattern_repetition,
+    "EntropyOfPitchSequence": entropy_of_pitch_sequence,
+    "VarianceInNoteDensity": variance_in_note_density,
+}
 
 
 # ============================================================
@@ -399,21 +713,55 @@ class VarianceInNoteDensityExtractor(FeatureExtractor):
 # ============================================================
 def extract_all_features(score, extractors):
     """
-    Given a music21 score and a list of extractor instances,
+    Given a music21 score and a mapping of feature names to extractors,
     returns a dictionary of feature names and their values.
 
+    The score is traversed once to build a ScoreFeatures context,
+    which is then shared by all extractors and cached for later calls.
+
     Args:
         score (music21.stream.Score): The musical score.
-        extractors (list of FeatureExtractor): A list of feature extractors.
+        extractors (dict): Mapping from feature name to extractor function, e.g. EXTRACTORS.
 
     Returns:
-        dict: Mapping from extractor class name to extracted value.
+        dict: Mapping from feature name to extracted value.
     """
-    features = {}
-    for extractor in extractors:
-        feature_value = extractor.extract(score)
-        features[extractor.__class__.__name__] = feature_value
-    return features
+    return extract_context_features(get_score_features(score), extractors)
+
+
+def extract_context_features(ctx, extractors):
+    """
+    Runs the extractors on an already built ScoreFeatures context.
+
+    Args:
+        ctx (ScoreFeatures): The note data of a music score.
+        extractors (dict): Mapping from feature name to extractor function, e.g. EXTRACTORS.
+
+    Returns:
+        dict: Mapping from feature name to extracted value.
+    """
+    # The extractors run serially: together they take well under a millisecond even
+    # on the longest score, far less than handing the context to another process.
+    # Parallelism belongs at the file level (see extract_corpus in main.py).
+    return {name: extractor(ctx) for name, extractor in extractors.items()}
+
+
+def extract_context_vector(ctx, extractors):
+    """
+    Like extract_context_features, but returns the values as an array ordered like extractors.
+
+    Args:
+        ctx (ScoreFeatures): The note data of a music score.
+        extractors (dict): Mapping from feature name to extractor function, e.g. EXTRACTORS.
+
+    Returns:
+        np.ndarray: One float64 value per extractor.
+    """
+    return np.fromiter(
+        (extractor(ctx) for extractor in extractors.values()),
+        dtype=np.float64,
+        count=len(extractors),
+    )
 
 
 if __name__ == "__main__":
@@ -421,55 +769,24 @@ if __name__ == "__main__":
     import music21
 
     if len(sys.argv) < 2:
-        print("Usage: python feature_extractors.py <path_to_midi_file>")
+        print("Usage: python feature_extractors.py <path_to_midi_file> [--symusic]")
         sys.exit(1)
     midi_path = sys.argv[1]
-    score = music21.converter.parse(midi_path)
-
-    # Print the score structure (for debugging)
-    score.show("text")
-    print("\n")
-
-    # Check if the score has parts.
-    if hasattr(score, "parts") and score.parts:
-        voice_part = None
-        for part in score.parts:
-            instruments = part.getInstruments(returnDefault=True)
-            for instr in instruments:
-                if (
-                    isinstance(instr, music21.instrument.Vocalist)
-                    or "voice" in instr.instrumentName.lower()
-                ):
-                    voice_part = part
-                    break
-            if voice_part:
-                break
-        if voice_part:
-            score_for_analysis = voice_part
-        else:
-            score_for_analysis = score.parts[0]
+
+    if "--symusic" in sys.argv[2:]:
+        # Read the note data with symusic; no music21 score is built.
+        ctx = build_score_features_from_midi(midi_path)
     else:
-        score_for_analysis = score
-
-    extractors = [
-        PitchRangeExtractor(),
-        AverageIntervalExtractor(),
-        IntervalComplexityExtractor(),
-        LeapFrequencyExtractor(),
-        ContourDirectionalityExtractor(),
-        MelodicContourComplexityExtractor(),
-        AverageNoteDurationExtractor(),
-        RhythmComplexityExtractor(),
-        SyncopationExtractor(),
-        NoteCountPerBarExtractor(),
-        NoteCountPerBarVariabilityExtractor(),
-        RestFrequencyExtractor(),
-        ScoreLengthInBarsExtractor(),
-        MelodicPatternRepetitionExtractor(),
-        RhythmicPatternRepetitionExtractor(),
-        EntropyOfPitchSequenceExtractor(),
-        VarianceInNoteDensityExtractor(),
-    ]
-    features = extract_all_features(score_for_analysis, extractors)
+        score = music21.converter.parse(midi_path)
+
+        # Print the score structure (for debugging)
+        score.show("text")
+        print("\n")
+
+        # Pick the part the same way main.py does.
+        score_for_analysis = select_score_for_analysis(score)
+        ctx = get_score_features(score_for_analysis)
+
+    features = extract_context_features(ctx, EXTRACTORS)
     for feature_name, value in features.items():
         print(f"{feature_name}: {value}")
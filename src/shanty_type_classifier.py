@@ -13,18 +13,27 @@ Usage:
 
 import os
 import re
+import importlib.util
 import json
 import csv
 import argparse
 from bs4 import BeautifulSoup
 import logging
 
+try:
+    import orjson
+except ImportError:  # Optional, the json module is used instead
+    orjson = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# lxml parses HTML in C, faster than the built-in parser; it is used when installed.
+_HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
 def parse_html_for_shanty_types(html_file):
     """
     Parse the HTML file to extract shanty names and their types.
@@ -36,7 +45,7 @@ def parse_html_for_shanty_types(html_file):
         dict: A dictionary mapping shanty names to their types
     """
     with open(html_file, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f.read(), 'html.parser')
+        soup = BeautifulSoup(f.read(), _HTML_PARSER)
     
     shanty_types = {}
     current_type = None
@@ -49,7 +58,7 @@ def parse_html_for_shanty_types(html_file):
         if any(keyword in text.lower() for keyword in ['shanties', 'shanty']):
             # Clean up the type name
             current_type = text.replace(':', '').strip()
-            logging.info(f"Found shanty type: {current_type}")
+            logging.info("Found shanty type: %s", current_type)
             
             # Get the table that follows this heading
             table = heading.find_next('table')
@@ -67,49 +76,88 @@ def parse_html_for_shanty_types(html_file):
                                 'type': current_type,
                                 'number': shanty_number
                             }
-                            logging.info(f"  - {shanty_number}: {shanty_name}")
+                            logging.info("  - %s: %s", shanty_number, shanty_name)
     
     return shanty_types
 
+# Punctuation dropped from shanty names, and track numbers in front of file names.
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_LEADING_DIGITS_RE = re.compile(r'^[0-9]+')
+
+# Numbered music files that don't correspond to shanties (e.g., music01.midi).
+_MUSIC_FILE_RE = re.compile(r'music[0-9]')
+
+# Extensions of the MIDI files, with their dot, compared in lowercase.
+_MIDI_EXTENSIONS = frozenset(('.mid', '.midi'))
+
+
+def iter_midi_files(music_dir, prefix=''):
+    """
+    Recursively yields the MIDI files in a directory, as they are found.
+
+    Args:
+        music_dir (str): Directory containing MIDI files
+        prefix (str): Path of music_dir relative to the directory the search started in
+
+    Yields:
+        str: The path of each MIDI (.mid or .midi) file relative to the starting
+            directory, which is just the file name for the files directly in it
+    """
+    subdirs = []
+    with os.scandir(music_dir) as entries:
+        for entry in entries:
+            # Like os.walk, do not follow symbolic links to directories
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, os.path.join(prefix, entry.name)))
+            elif os.path.splitext(entry.name)[1].lower() in _MIDI_EXTENSIONS:
+                yield os.path.join(prefix, entry.name)
+
+    # Files of a directory come before those of its subdirectories
+    for subdir, subdir_prefix in subdirs:
+        yield from iter_midi_files(subdir, subdir_prefix)
+
+
 def map_shanties_to_midi_files(shanty_types, music_dir):
     """
     Map shanty names to MIDI files in the dataset.
     
     Args:
         shanty_types (dict): Dictionary mapping shanty names to their types
-        music_dir (str): Directory containing MIDI files
+        music_dir (str): Directory containing MIDI files, searched recursively
         
     Returns:
-        dict: A dictionary mapping MIDI filenames to shanty types
+        dict: A dictionary mapping MIDI file paths, relative to music_dir, to shanty types.
+            Files directly in music_dir are keyed by their file name.
     """
     midi_to_type = {}
     
-    # Get all MIDI files in the directory
-    midi_files = [f for f in os.listdir(music_dir) if f.endswith(('.midi', '.mid'))]
-    
     # Create a dictionary for fuzzy matching
     fuzzy_map = {}
     for shanty_name, info in shanty_types.items():
         # Convert shanty name to lowercase and remove special characters for matching
-        simple_name = re.sub(r'[^\w\s]', '', shanty_name.lower())
-        simple_name = re.sub(r'\s+', ' ', simple_name).strip()
+        # and collapse runs of whitespace (split() also trims the ends)
+        simple_name = " ".join(_PUNCTUATION_RE.sub('', shanty_name.lower()).split())
         fuzzy_map[simple_name] = {
             'original_name': shanty_name,
             'type': info['type'],
             'number': info['number']
         }
     
-    # Match MIDI files to shanty types
-    for midi_file in midi_files:
+    # Match MIDI files to shanty types as they are found
+    # Files are keyed by their relative path, so files with the same name in
+    # different subdirectories are kept apart; only the name is matched.
+    for midi_file in iter_midi_files(music_dir):
+        file_name = os.path.basename(midi_file)
+
         # Skip music files that don't correspond to shanties (e.g., music01.midi)
-        if midi_file.startswith('music') and midi_file[5].isdigit():
+        if _MUSIC_FILE_RE.match(file_name):
             continue
             
         # Get the base name without extension
-        base_name = os.path.splitext(midi_file)[0]
+        base_name = os.path.splitext(file_name)[0]
         
         # Remove leading numbers (e.g., 01billy -> billy)
-        base_name_without_number = re.sub(r'^[0-9]+', '', base_name)
+        base_name_without_number = _LEADING_DIGITS_RE.sub('', base_name)
         
         # Try to match with shanty names
         matched = False
@@ -122,11 +170,11 @@ def map_shanties_to_midi_files(shanty_types, music_dir):
                     'shanty_number': info['number']
                 }
                 matched = True
-                logging.info(f"Matched {midi_file} to {info['original_name']} ({info['type']})")
+                logging.info("Matched %s to %s (%s)", midi_file, info['original_name'], info['type'])
                 break
         
         if not matched:
-            logging.warning(f"Could not match {midi_file} to any shanty in the index")
+            logging.warning("Could not match %s to any shanty in the index", midi_file)
     
     return midi_to_type
 
@@ -138,9 +186,14 @@ def save_to_json(midi_to_type, output_file):
         midi_to_type (dict): Dictionary mapping MIDI filenames to shanty types
         output_file (str): Path to the output JSON file
     """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(midi_to_type, f, indent=2)
-    logging.info(f"Saved shanty type data to {output_file}")
+    # orjson, when installed, is much faster and writes the UTF-8 bytes directly
+    if orjson is not None:
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(midi_to_type, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(midi_to_type, f, indent=2)
+    logging.info("Saved shanty type data to %s", output_file)
 
 def save_to_csv(midi_to_type, output_file):
     """
@@ -153,18 +206,16 @@ def save_to_csv(midi_to_type, output_file):
     fieldnames = ['midi_file', 'shanty_name', 'shanty_type', 'shanty_number']
     
     with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
         
-        for midi_file, info in midi_to_type.items():
-            writer.writerow({
-                'midi_file': midi_file,
-                'shanty_name': info['shanty_name'],
-                'shanty_type': info['shanty_type'],
-                'shanty_number': info['shanty_number']
-            })
+        # Rows are built positionally, in the order of fieldnames, and written in one call
+        writer.writerows(
+            (midi_file, info['shanty_name'], info['shanty_type'], info['shanty_number'])
+            for midi_file, info in midi_to_type.items()
+        )
     
-    logging.info(f"Saved shanty type data to {output_file}")
+    logging.info("Saved shanty type data to %s", output_file)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -184,11 +235,11 @@ def main():
     csv_output = os.path.join(args.output_dir, 'shanty_types.csv')
     
     # Parse HTML and extract shanty types
-    logging.info(f"Parsing HTML file: {args.html_file}")
+    logging.info("Parsing HTML file: %s", args.html_file)
     shanty_types = parse_html_for_shanty_types(args.html_file)
     
     # Map shanties to MIDI files
-    logging.info(f"Mapping shanties to MIDI files in: {args.music_dir}")
+    logging.info("Mapping shanties to MIDI files in: %s", args.music_dir)
     midi_to_type = map_shanties_to_midi_files(shanty_types, args.music_dir)
     
     # Save results
@@ -196,7 +247,7 @@ def main():
     save_to_csv(midi_to_type, csv_output)
     
     logging.info("Classification complete!")
-    logging.info(f"Results saved to {json_output} and {csv_output}")
+    logging.info("Results saved to %s and %s", json_output, csv_output)
     
 if __name__ == "__main__":
     main()